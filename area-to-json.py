@@ -25,9 +25,36 @@
 from pyparsing import *
 
 import argparse
+import asyncio
+import bisect
+import collections
+import cProfile
+import concurrent.futures
+import contextlib
+import dataclasses
+import glob
+import hashlib
+import http
 import json
+import locale
+import mmap
 import os
+import platform
+import pyparsing
 import re
+import shutil
+import sys
+import time
+import tracemalloc
+import types
+import urllib.parse
+
+from area_binary import write_binary
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 space               = White(' ',exact=1)
 # read everything till a tilde.
@@ -36,6 +63,40 @@ vnum                = Suppress(Literal("#")) + Word(nums).setResultsName("vnum")
 asterisk_comment    = Regex("[\*].*")
 
 
+class Keyed(ParserElement):
+    """
+    MatchFirst for alternatives that each start with their own literal. The
+    literal at the current location (matched by key) picks the only alternative
+    worth trying, instead of failing through all the ones listed before it.
+    """
+
+    def __init__(self, alternatives, key="."):
+        super().__init__()
+        self.alternatives   = alternatives
+        self.key            = re.compile(key)
+        self.mayReturnEmpty = False
+        self.mayIndexError  = False
+        self.errmsg         = "Expected one of " + ", ".join(alternatives)
+
+    def _generateDefaultName(self):
+        return "{" + " | ".join(str(e) for e in self.alternatives.values()) + "}"
+
+    def recurse(self):
+        return list(self.alternatives.values())
+
+    def streamline(self):
+        super().streamline()
+        for e in self.alternatives.values():
+            e.streamline()
+        return self
+
+    def parseImpl(self, instring, loc, doActions=True):
+        match               = self.key.match(instring, loc)
+        if match is None or match.group() not in self.alternatives:
+            raise ParseException(instring, loc, self.errmsg, self)
+        return self.alternatives[match.group()]._parse(instring, loc, doActions)
+
+
 area_grammar        =   Suppress(Literal("#AREA")) +\
                         tilde_string.setResultsName('file') + Suppress(restOfLine) +\
                         tilde_string.setResultsName('name') + Suppress(restOfLine) +\
@@ -62,17 +123,17 @@ room_grammar        =   Suppress(Literal("#ROOMS")) +\
                                 tilde_string.setResultsName('description') + Suppress(restOfLine) +\
                                 Suppress(Word(nums)) +\
                                 Word(alphanums+"|"+"-").setResultsName('flags') +\
-                                Word("-"+nums).setResultsName('sector') + Suppress(restOfLine) &\
-                                ZeroOrMore(
-                                    (Suppress(Literal("H")) + Word(nums)).setResultsName('heal_rate') |
-                                    (Suppress(Literal("M")) + Word(nums)).setResultsName('mana_rate')|
-                                    (Suppress(Literal("O")) + tilde_string).setResultsName('owner') |
-                                    Group(
+                                Word("-"+nums).setResultsName('sector') + Suppress(restOfLine) +\
+                                ZeroOrMore(Keyed({
+                                    "H": (Suppress(Literal("H")) + Word(nums)).setResultsName('heal_rate'),
+                                    "M": (Suppress(Literal("M")) + Word(nums)).setResultsName('mana_rate'),
+                                    "O": (Suppress(Literal("O")) + tilde_string).setResultsName('owner'),
+                                    "E": Group(
                                         Suppress(Literal("E")) +\
                                         tilde_string.setResultsName('keyword') +\
                                         tilde_string.setResultsName('description')
-                                    ).setResultsName('extra_descriptions*') |
-                                    Group(
+                                    ).setResultsName('extra_descriptions*'),
+                                    "D": Group(
                                         Combine(
                                             Literal("D") +\
                                             Word(nums)
@@ -83,7 +144,7 @@ room_grammar        =   Suppress(Literal("#ROOMS")) +\
                                         Word("-" + nums).setResultsName('exit_key') +\
                                         Word("-" +nums).setResultsName('exit_u1_vnum')
                                     ).setResultsName('exits*')
-                                ) +\
+                                })) +\
                                 Suppress(Literal("S"))
                             )
                         ) + Suppress(Literal("#0"))
@@ -104,25 +165,25 @@ object_grammar      =   Suppress(Literal("#OBJECTS")) +\
                                 Word("-"+nums).setResultsName('weight') +\
                                 Word("-"+nums).setResultsName('cost') +\
                                 Word(alphanums).setResultsName('condition') + Suppress(restOfLine) +\
-                                ZeroOrMore(
-                                    Group(
+                                ZeroOrMore(Keyed({
+                                    "A": Group(
                                         Suppress(Literal("A")) +\
                                         Word("-"+nums).setResultsName('location') +\
                                         Word("-"+nums).setResultsName('modifier')
-                                    ).setResultsName('affects_a*') |
-                                    Group(
+                                    ).setResultsName('affects_a*'),
+                                    "F": Group(
                                         Suppress(Literal("F")) +\
                                         Word(alphas).setResultsName('where') +\
                                         Word(nums).setResultsName('location') +\
                                         Word("-"+nums).setResultsName('modifier') +\
                                         Word(alphanums).setResultsName('bitvector')
-                                    ).setResultsName('affects_f*') |
-                                    Group(
+                                    ).setResultsName('affects_f*'),
+                                    "E": Group(
                                         Suppress(Literal("E")) +\
                                         tilde_string.setResultsName('keyword') +\
                                         tilde_string.setResultsName('description')
                                     ).setResultsName('extra_descriptions*')
-                                )
+                                }))
                             )
                         ) + Suppress(Literal("#0"))
 
@@ -227,16 +288,16 @@ old_mobile_grammar  =   Suppress(Literal("#MOBOLD")) +\
                         ) + Suppress(Literal("#0"))
 
 reset_grammar       =   Suppress(Literal("#RESETS")) +\
-                        ZeroOrMore(
-                            Suppress(asterisk_comment) |
-                            Group(Literal("G").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Suppress(restOfLine)) |
-                            Group(Literal("R").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Suppress(restOfLine)) |
-                            Group(Literal("O").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Suppress(restOfLine)) |
-                            Group(Literal("E").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Suppress(restOfLine)) |
-                            Group(Literal("D").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Suppress(restOfLine)) |
-                            Group(Literal("P").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Word("-" + nums).setResultsName('arg4') + Suppress(restOfLine)) |
-                            Group(Literal("M").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Word("-" + nums).setResultsName('arg4') + Suppress(restOfLine))
-                        ) + Suppress(Literal("S"))
+                        ZeroOrMore(Keyed({
+                            "*": Suppress(asterisk_comment),
+                            "G": Group(Literal("G").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Suppress(restOfLine)),
+                            "R": Group(Literal("R").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Suppress(restOfLine)),
+                            "O": Group(Literal("O").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Suppress(restOfLine)),
+                            "E": Group(Literal("E").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Suppress(restOfLine)),
+                            "D": Group(Literal("D").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Suppress(restOfLine)),
+                            "P": Group(Literal("P").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Word("-" + nums).setResultsName('arg4') + Suppress(restOfLine)),
+                            "M": Group(Literal("M").setResultsName('command') + Suppress(Word("-" + nums)) + Word("-" + nums).setResultsName('arg1') + Word("-" + nums).setResultsName('arg2') + Word("-" + nums).setResultsName('arg3') + Word("-" + nums).setResultsName('arg4') + Suppress(restOfLine))
+                        })) + Suppress(Literal("S"))
 
 shop_grammar        =   Suppress(Literal("#SHOPS")) +\
                         ZeroOrMore(
@@ -302,50 +363,1911 @@ areaflag_grammar    =   Suppress(Literal("#FLAG")) +\
                         Word(alphas).setResultsName('area_flag')
 
 
-def parse_file(filemem):
-
-    pattern         =   (Group(area_grammar).setResultsName("area") |\
-                            Group(room_grammar).setResultsName("rooms") |\
-                            Group(object_grammar).setResultsName("objects") |\
-                            Group(old_object_grammar).setResultsName("old_objects") |\
-                            Group(mobile_grammar).setResultsName("mobiles") |\
-                            Group(old_mobile_grammar).setResultsName("old_mobiles") |\
-                            Group(reset_grammar).setResultsName("resets") |\
-                            Group(shop_grammar).setResultsName("shops") |\
-                            Group(olimit_grammar).setResultsName("olimits") |\
-                            Group(practicer_grammar).setResultsName("practicers") |\
-                            Group(special_grammar).setResultsName("specials") |\
-                            Group(omprog_grammar).setResultsName("omprogs") |\
-                            Group(help_grammar).setResultsName("helps") |\
-                            Group(resetmessage_grammar).setResultsName("area_reset_message") |\
-                            Group(areaflag_grammar).setResultsName("area_flag")
-                        )
+########################################################################################
+#  Hand-written scanner ("fast" engine)                                                #
+#                                                                                      #
+#  Reads the same file format as the grammars above in a single pass. Every reader     #
+#  mirrors the pyparsing element it replaces: leading whitespace is skipped, a Word    #
+#  is the longest run of its characters, a tilde string is everything up to the next  #
+#  "~" and restOfLine stops before the newline. A failed record rewinds to where it    #
+#  started, just like ZeroOrMore does, so both engines return the same dict.           #
+########################################################################################
+
+white_chars         = re.compile(r"[ \t\n\r]*")
+
+def word_regex(chars):
+    # the first character can not be whitespace, otherwise backtracking would let
+    # Word(alphanums+" ") match the whitespace pyparsing has already skipped.
+    first           = "".join(c for c in chars if c not in " \t\n\r")
+    return re.compile(r"[ \t\n\r]*([" + re.escape(first) + "][" + re.escape(chars) + "]*)")
+
+num_word            = word_regex(nums)
+signed_word         = word_regex("-"+nums)
+alpha_word          = word_regex(alphas)
+alnum_word          = word_regex(alphanums)
+flag_word           = word_regex(alphanums+"|")
+room_flag_word      = word_regex(alphanums+"|"+"-")
+item_type_word      = word_regex(alphanums+"_"+"-")
+values_word         = word_regex(alphanums+" "+"'"+"-")
+dice_word           = word_regex(alphanums+"+")
+name_word           = word_regex(alphanums+"_")
+exit_door_word      = re.compile(r"[ \t\n\r]*(D[0-9]+)")
+low_range_word      = re.compile(r"[ \t\n\r]*\{ *([0-9]+)")
+high_range_word     = re.compile(r"[ \t\n\r]*([0-9]+) *\}")
+
+
+class AreaScanner(object):
+
+    def __init__(self, text, pos=0):
+        self.text           = text
+        self.pos            = pos
+        self.record_start   = pos
+
+    def fail(self, expected):
+        raise ParseException(self.text, self.pos, "Expected " + expected)
+
+    def skip(self):
+        self.pos    = white_chars.match(self.text, self.pos).end()
+        return self.pos
+
+    def peek(self):
+        pos         = self.skip()
+        return self.text[pos:pos+1]
+
+    def at(self, string):
+        pos         = self.skip()
+        return self.text.startswith(string, pos)
+
+    def literal(self, string):
+        if not self.at(string):
+            self.fail(repr(string))
+        self.pos   += len(string)
+
+    def word(self, regex, expected="word"):
+        match       = regex.match(self.text, self.pos)
+        if match is None:
+            self.fail(expected)
+        self.pos    = match.end()
+        # words are flags, numbers and names that repeat all over a world,
+        # interned every occurrence shares one str
+        return sys.intern(match.group(1))
+
+    def tilde_string(self):
+        pos         = self.skip()
+        end         = self.text.find("~", pos)
+        if end < 0:
+            self.fail('"~"')
+        self.pos    = end + 1
+        return self.text[pos:end]
+
+    def symbol(self):
+        # a ~ string with few distinct values (race, material, keyword...)
+        return sys.intern(self.tilde_string())
+
+    def rest_of_line(self):
+        end         = self.text.find("\n", self.pos)
+        self.pos    = len(self.text) if end < 0 else end
+
+    def line(self, value):
+        # <token> + Suppress(restOfLine)
+        self.rest_of_line()
+        return value
+
+
+# MappedScanner patterns: the decoded text has its tabs expanded, so a tab has to
+# match wherever a space does
+mapped_white_chars  = re.compile(rb"[ \t\n\r]*")
+mapped_rest_of_line = re.compile(rb"[^\r\n]*")
+mapped_regexes      = {}
+
+def byte_regex(regex):
+    try:
+        return mapped_regexes[regex]
+    except KeyError:
+        pattern     = regex.pattern.replace("\\ ", "\\ \\t").replace(" *", "[ \\t]*")
+        mapped_regexes[regex] = re.compile(pattern.encode())
+        return mapped_regexes[regex]
+
+class MappedScanner(AreaScanner):
+    """
+    AreaScanner over the raw bytes of an area file, usually a read-only mmap.
+    Positions are byte offsets, nothing is decoded except the fields that are
+    returned and the scanner never looks past end.
+    """
+
+    def __init__(self, data, pos=0, end=None):
+        AreaScanner.__init__(self, data, pos)
+        self.end        = len(data) if end is None else end
+        self.encoding   = locale.getpreferredencoding(False)
+
+    def line_start(self, pos):
+        start       = self.text.rfind(b"\n", 0, pos) + 1
+        return self.text.rfind(b"\r", start, pos) + 1 or start
+
+    def decode(self, start, end):
+        # tabs are expanded from the column the field starts at, as they are
+        # when the whole file is decoded and expanded
+        text        = str(self.text[start:end], self.encoding)
+        if "\r" in text:
+            text    = text.replace("\r\n", "\n").replace("\r", "\n")
+        if "\t" not in text:
+            return text
+        column      = len(self.decode(self.line_start(start), start))
+        return (" " * column + text).expandtabs()[column:]
+
+    def fail(self, expected):
+        # only the failing line is decoded, locate_error adds the line number
+        # once the error turns out to be fatal
+        start       = self.line_start(self.pos)
+        end         = mapped_rest_of_line.match(self.text, self.pos, self.end).end()
+        column      = len(self.decode(start, self.pos))
+        pe          = ParseException(self.decode(start, end), column,
+                                     "Expected %s (at byte %d)" % (expected, self.pos))
+        pe.byte_offset = self.pos
+        raise pe
+
+    def skip(self):
+        self.pos    = mapped_white_chars.match(self.text, self.pos, self.end).end()
+        return self.pos
+
+    def peek(self):
+        pos         = self.skip()
+        return self.text[pos:min(pos+1, self.end)].decode("latin-1")
+
+    def at(self, string):
+        pos         = self.skip()
+        string      = string.encode()
+        return pos + len(string) <= self.end and self.text[pos:pos+len(string)] == string
+
+    def word(self, regex, expected="word"):
+        match       = byte_regex(regex).match(self.text, self.pos, self.end)
+        if match is None:
+            self.fail(expected)
+        self.pos    = match.end()
+        # words are ascii and single line, only a tab needs the full decode
+        value       = match.group(1)
+        if b"\t" in value:
+            return sys.intern(self.decode(match.start(1), match.end(1)))
+        return sys.intern(value.decode("ascii"))
+
+    def tilde_string(self):
+        pos         = self.skip()
+        end         = self.text.find(b"~", pos, self.end)
+        if end < 0:
+            self.fail('"~"')
+        self.pos    = end + 1
+        return self.decode(pos, end)
+
+    def rest_of_line(self):
+        self.pos    = mapped_rest_of_line.match(self.text, self.pos, self.end).end()
+
+    def finish(self):
+        # a section has to be read up to the boundary index_sections found
+        if self.skip() < self.end:
+            self.fail("end of section")
+
+def locate_error(pe, data):
+    """Give a MappedScanner error the line number of its byte offset in data."""
+    if hasattr(pe, "byte_offset"):
+        lineno      = 1
+        for start in range(0, pe.byte_offset, 1 << 20):
+            lineno += data[start:min(start + (1 << 20), pe.byte_offset)].count(b"\n")
+        pe.lineno   = lineno
+    return pe
+
+def zero_or_more(sc, read):
+    items           = []
+    while True:
+        start       = sc.pos
+        try:
+            item    = read(sc)
+        except ParseException:
+            sc.pos  = start
+            return items
+        if item is not None:
+            items.append(item)
+
+def add_fields(record, fields):
+    # fields named "name*" collect every match, like setResultsName('name*')
+    for key, value in fields:
+        if key[-1] == "*":
+            record.setdefault(key[:-1], []).append(value)
+        else:
+            record[key] = value
+    return record
+
+def read_vnum(sc):
+    sc.literal("#")
+    return sc.line(sc.word(num_word, "vnum"))
+
+def read_extra_description(sc):
+    sc.pos         += 1
+    return "extra_descriptions*", {
+        'keyword':      sc.symbol(),
+        'description':  sc.tilde_string()
+    }
+
+def read_area(sc):
+    sc.literal("#AREA")
+    return {
+        'file':         sc.line(sc.tilde_string()),
+        'name':         sc.line(sc.tilde_string()),
+        'low_range':    sc.word(low_range_word, "low_range"),
+        'high_range':   sc.word(high_range_word, "high_range"),
+        'writer':       sc.word(alnum_word, "writer"),
+        'credits':      sc.line(sc.tilde_string()),
+        'min_vnum':     sc.word(num_word, "min_vnum"),
+        'max_vnum':     sc.line(sc.word(num_word, "max_vnum"))
+    }
+
+def read_room_field(sc):
+    c               = sc.peek()
+    if c == "H":
+        sc.pos     += 1
+        return 'heal_rate', [sc.word(num_word, "heal_rate")]
+    if c == "M":
+        sc.pos     += 1
+        return 'mana_rate', [sc.word(num_word, "mana_rate")]
+    if c == "O":
+        sc.pos     += 1
+        return 'owner', [sc.symbol()]
+    if c == "E":
+        return read_extra_description(sc)
+    if c == "D":
+        return "exits*", {
+            'exit_door':        sc.word(exit_door_word, "exit_door"),
+            'exit_description': sc.tilde_string(),
+            'exit_keyword':     sc.symbol(),
+            'exit_locks':       sc.word(num_word, "exit_locks"),
+            'exit_key':         sc.word(signed_word, "exit_key"),
+            'exit_u1_vnum':     sc.word(signed_word, "exit_u1_vnum")
+        }
+    sc.fail("room field")
+
+def read_room(sc):
+    room            = {
+        'vnum':         read_vnum(sc),
+        'name':         sc.line(sc.tilde_string()),
+        'description':  sc.line(sc.tilde_string())
+    }
+    sc.word(num_word, "area number")
+    room['flags']   = sc.word(room_flag_word, "flags")
+    room['sector']  = sc.line(sc.word(signed_word, "sector"))
+    add_fields(room, zero_or_more(sc, read_room_field))
+    sc.literal("S")
+    return room
+
+def read_object_field(sc):
+    c               = sc.peek()
+    if c == "A":
+        sc.pos     += 1
+        return "affects_a*", {
+            'location':     sc.word(signed_word, "location"),
+            'modifier':     sc.word(signed_word, "modifier")
+        }
+    if c == "F":
+        sc.pos     += 1
+        return "affects_f*", {
+            'where':        sc.word(alpha_word, "where"),
+            'location':     sc.word(num_word, "location"),
+            'modifier':     sc.word(signed_word, "modifier"),
+            'bitvector':    sc.word(alnum_word, "bitvector")
+        }
+    if c == "E":
+        return read_extra_description(sc)
+    sc.fail("object field")
+
+def read_object(sc):
+    obj             = {
+        'vnum':                 read_vnum(sc),
+        'name':                 sc.line(sc.tilde_string()),
+        'short_description':    sc.line(sc.tilde_string()),
+        'description':          sc.line(sc.tilde_string()),
+        'material':             sc.line(sc.symbol()),
+        'type':                 sc.word(item_type_word, "type"),
+        'extra_flags':          sc.word(flag_word, "extra_flags"),
+        'wear_flags':           sc.line(sc.word(flag_word, "wear_flags")),
+        'values':               sc.word(values_word, "values"),
+        'level':                sc.word(signed_word, "level"),
+        'weight':               sc.word(signed_word, "weight"),
+        'cost':                 sc.word(signed_word, "cost"),
+        'condition':            sc.line(sc.word(alnum_word, "condition"))
+    }
+    return add_fields(obj, zero_or_more(sc, read_object_field))
+
+def read_old_object_field(sc):
+    c               = sc.peek()
+    if c == "A":
+        sc.pos     += 1
+        return "affects_a*", {
+            'location':     sc.word(signed_word, "location"),
+            'modifier':     sc.word(signed_word, "modifier")
+        }
+    if c == "E":
+        return read_extra_description(sc)
+    sc.fail("object field")
+
+def read_old_object(sc):
+    obj             = {
+        'vnum':                 read_vnum(sc),
+        'name':                 sc.tilde_string(),
+        'short_description':    sc.tilde_string(),
+        'description':          sc.tilde_string()
+    }
+    sc.tilde_string()
+    obj['type']             = sc.word(alnum_word, "type")
+    obj['extra_flags']      = sc.word(flag_word, "extra_flags")
+    obj['wear_flags']       = sc.word(flag_word, "wear_flags")
+    obj['values']           = sc.word(values_word, "values")
+    obj['weight']           = sc.word(num_word, "weight")
+    obj['cost']             = sc.word(num_word, "cost")
+    sc.word(num_word)
+    return add_fields(obj, zero_or_more(sc, read_old_object_field))
+
+def read_mobile_field(sc):
+    sc.literal("F")
+    return "affects_f*", {
+        'word':         sc.word(alpha_word, "word"),
+        'flag':         sc.word(alnum_word, "flag")
+    }
+
+def read_mobile(sc):
+    mob             = {
+        'vnum':                 read_vnum(sc),
+        'name':                 sc.line(sc.tilde_string()),
+        'short_description':    sc.line(sc.tilde_string()),
+        'long_description':     sc.line(sc.tilde_string()),
+        'description':          sc.line(sc.tilde_string()),
+        'race':                 sc.line(sc.symbol()),
+        'act':                  sc.word(flag_word, "act"),
+        'affected_by':          sc.word(flag_word, "affected_by"),
+        'alignment':            sc.word(signed_word, "alignment"),
+        'group':                sc.line(sc.word(num_word, "group")),
+        'level':                sc.word(num_word, "level"),
+        'hitroll':              sc.word(signed_word, "hitroll"),
+        'hit_dice':             sc.word(dice_word, "hit_dice"),
+        'mana_dice':            sc.word(dice_word, "mana_dice"),
+        'dam_dice':             sc.word(dice_word, "dam_dice"),
+        'dam_type':             sc.line(sc.word(alnum_word, "dam_type")),
+        'ac_pierce':            sc.word(signed_word, "ac_pierce"),
+        'ac_bash':              sc.word(signed_word, "ac_bash"),
+        'ac_slash':             sc.word(signed_word, "ac_slash"),
+        'ac_exotic':            sc.line(sc.word(signed_word, "ac_exotic")),
+        'off_flags':            sc.word(alnum_word, "off_flags"),
+        'imm_flags':            sc.word(alnum_word, "imm_flags"),
+        'res_flags':            sc.word(alnum_word, "res_flags"),
+        'vuln_flags':           sc.line(sc.word(alnum_word, "vuln_flags")),
+        'start_pos':            sc.word(alnum_word, "start_pos"),
+        'default_pos':          sc.word(alnum_word, "default_pos"),
+        'sex':                  sc.word(alnum_word, "sex"),
+        'wealth':               sc.line(sc.word(num_word, "wealth")),
+        'form':                 sc.word(alnum_word, "form"),
+        'parts':                sc.word(alnum_word, "parts"),
+        'size':                 sc.word(alnum_word, "size"),
+        'material':             sc.line(sc.word(alnum_word, "material"))
+    }
+    return add_fields(mob, zero_or_more(sc, read_mobile_field))
+
+def read_old_mobile(sc):
+    mob             = {
+        'vnum':                 read_vnum(sc),
+        'name':                 sc.line(sc.tilde_string()),
+        'short_description':    sc.line(sc.tilde_string()),
+        'long_description':     sc.line(sc.tilde_string()),
+        'description':          sc.line(sc.tilde_string()),
+        'act':                  sc.word(flag_word, "act"),
+        'affected_by':          sc.word(flag_word, "affected_by"),
+        'alignment':            sc.word(signed_word, "alignment")
+    }
+    sc.line(sc.word(alnum_word))
+    mob['level']            = sc.word(num_word, "level")
+    sc.word(num_word)
+    sc.word(num_word)
+    sc.word(dice_word)
+    sc.line(sc.word(dice_word))
+    mob['wealth']           = sc.word(num_word, "wealth")
+    sc.line(sc.word(num_word))
+    mob['start_pos']        = sc.word(num_word, "start_pos")
+    mob['default_pos']      = sc.word(num_word, "default_pos")
+    mob['sex']              = sc.line(sc.word(num_word, "sex"))
+    return mob
+
+reset_arguments     = {"G": 2, "R": 2, "O": 3, "E": 3, "D": 3, "P": 4, "M": 4}
+
+def read_reset(sc):
+    c               = sc.peek()
+    if c == "*":
+        return sc.rest_of_line()
+    if c not in reset_arguments:
+        sc.fail("reset command")
+    sc.pos         += 1
+    reset           = {'command': c}
+    sc.word(signed_word)
+    for i in range(1, reset_arguments[c] + 1):
+        reset['arg%d' % i] = sc.word(signed_word, "arg%d" % i)
+    return sc.line(reset)
+
+def read_shop(sc):
+    shop            = {'keeper': sc.word(num_word, "keeper")}
+    for key in ('buy_type_0', 'buy_type_1', 'buy_type_2', 'buy_type_3', 'buy_type_4',
+                'profit_buy', 'profit_sell', 'open_hour', 'close_hour'):
+        shop[key]   = sc.word(signed_word, key)
+    return sc.line(shop)
+
+def read_olimit(sc):
+    sc.literal("O")
+    return {
+        'vnum':         sc.word(num_word, "vnum"),
+        'limit':        sc.line(sc.word(num_word, "limit"))
+    }
+
+def read_practicer(sc):
+    if sc.peek() == "*":
+        return sc.rest_of_line()
+    sc.literal("M")
+    return {
+        'vnum':         sc.word(num_word, "vnum"),
+        'practicer':    sc.line(sc.word(name_word, "practicer"))
+    }
+
+def read_special(sc):
+    if sc.peek() == "*":
+        return sc.rest_of_line()
+    sc.literal("M")
+    return {
+        'vnum':         sc.word(num_word, "vnum"),
+        'spec_fun':     sc.line(sc.word(name_word, "spec_fun"))
+    }
+
+def read_omprog(sc):
+    c               = sc.peek()
+    if c == "*":
+        return sc.rest_of_line()
+    if c not in ("M", "O"):
+        sc.fail("M or O")
+    sc.pos         += 1
+    return {
+        'command':      c,
+        'vnum':         sc.word(num_word, "vnum"),
+        'progtype':     sc.word(name_word, "progtype"),
+        'progname':     sc.line(sc.word(name_word, "progname"))
+    }
+
+def read_help(sc):
+    if sc.at("0 $~"):
+        sc.pos     += 4
+        return None
+    return {
+        'level':        sc.word(signed_word, "level"),
+        'keyword':      sc.tilde_string(),
+        'text':         sc.tilde_string()
+    }
+
+def section_reader(header, read, end):
+    # <header> + ZeroOrMore(read) + Suppress(Literal(end)), yielding each record
+    # as soon as it is read
+    def read_section(sc):
+        sc.literal(header)
+        while True:
+            start   = sc.record_start = sc.skip()
+            try:
+                item = read(sc)
+            except ParseException:
+                sc.pos = start
+                break
+            if item is not None:
+                yield item
+        if end is not None:
+            sc.literal(end)
+    return read_section
+
+def section_value(value):
+    # record sections are generators, collect them for the dict output
+    return list(value) if isinstance(value, types.GeneratorType) else value
+
+def read_resetmessage(sc):
+    sc.literal("#RESETMESSAGE")
+    return {'area_reset_message': sc.tilde_string()}
+
+def read_areaflag(sc):
+    sc.literal("#FLAG")
+    return {'area_flag': sc.word(alpha_word, "area_flag")}
+
+# same order as the alternatives of the pyparsing pattern in parse_file
+section_readers     = [
+    ("#AREA",           "area",                 read_area),
+    ("#ROOMS",          "rooms",                section_reader("#ROOMS", read_room, "#0")),
+    ("#OBJECTS",        "objects",              section_reader("#OBJECTS", read_object, "#0")),
+    ("#OBJOLD",         "old_objects",          section_reader("#OBJOLD", read_old_object, "#0")),
+    ("#MOBILES",        "mobiles",              section_reader("#MOBILES", read_mobile, "#0")),
+    ("#MOBOLD",         "old_mobiles",          section_reader("#MOBOLD", read_old_mobile, "#0")),
+    ("#RESETS",         "resets",               section_reader("#RESETS", read_reset, "S")),
+    ("#SHOPS",          "shops",                section_reader("#SHOPS", read_shop, "0")),
+    ("#OLIMITS",        "olimits",              section_reader("#OLIMITS", read_olimit, "S")),
+    ("#PRACTICERS",     "practicers",           section_reader("#PRACTICERS", read_practicer, "S")),
+    ("#SPECIALS",       "specials",             section_reader("#SPECIALS", read_special, "S")),
+    ("#OMPROGS",        "omprogs",              section_reader("#OMPROGS", read_omprog, "S")),
+    ("#HELPS",          "helps",                section_reader("#HELPS", read_help, None)),
+    ("#RESETMESSAGE",   "area_reset_message",   read_resetmessage),
+    ("#FLAG",           "area_flag",            read_areaflag)
+]
+
+def read_section(sc):
+    pos             = sc.skip()
+    for header, name, read in section_readers:
+        if sc.at(header):
+            try:
+                return name, section_value(read(sc))
+            except ParseException:
+                sc.pos = pos
+    sc.fail("section")
+
+def scan_area(sc):
+    result          = dict(zero_or_more(sc, read_section))
+    sc.literal("#$")
+    return result
+
+def scan_file(filemem):
+    # pyparsing expands tabs before parsing, do the same so the strings match
+    return scan_area(AreaScanner(filemem.expandtabs()))
+
+def scan_mapped(data):
+    """scan_file over the undecoded bytes (or mmap) of an area file."""
+    try:
+        return scan_area(MappedScanner(data))
+    except ParseException as pe:
+        raise locate_error(pe, data)
+
+# section index: "#ROOMS" etc. at the start of a line, "#$" closes the last one
+section_names       = dict((header[1:], name) for header, name, read in section_readers)
+section_parsers     = dict((name, read) for header, name, read in section_readers)
+section_header      = re.compile(rb"^#([A-Z]+|\$)", re.M)
+
+# what the last line of each section looks like. A header line found before the
+# current section has reached its end is text inside a ~ string (help text
+# usually) and does not start a new section.
+section_ends        = dict((name, re.compile(pattern)) for name, pattern in [
+    ("area",                rb"^\s*[0-9]"),
+    ("rooms",               rb"(^|\s)#0$"),
+    ("objects",             rb"(^|\s)#0$"),
+    ("old_objects",         rb"(^|\s)#0$"),
+    ("mobiles",             rb"(^|\s)#0$"),
+    ("old_mobiles",         rb"(^|\s)#0$"),
+    ("resets",              rb"(^|\s)S$"),
+    ("shops",               rb"(^|\s)0$"),
+    ("olimits",             rb"(^|\s)S$"),
+    ("practicers",          rb"(^|\s)S$"),
+    ("specials",            rb"(^|\s)S$"),
+    ("omprogs",             rb"(^|\s)S$"),
+    ("helps",               rb"~$"),
+    ("area_reset_message",  rb"~$"),
+    ("area_flag",           rb"[A-Za-z]$")
+])
+
+def section_tail(data, start, end):
+    # the last non blank line of data[start:end] without the trailing whitespace
+    while end > start:
+        line_start  = max(start, data.rfind(b"\n", start, end) + 1, data.rfind(b"\r", start, end) + 1)
+        tail        = data[line_start:end].rstrip()
+        if tail or line_start == start:
+            return tail
+        end         = line_start - 1
+    return b""
+
+def section_closed(name, data, start, end):
+    tail            = section_tail(data, start, end)
+    if not section_ends[name].search(tail):
+        return False
+    if name == "helps" and not tail.endswith(b"0 $~"):
+        # "0 $~" is optional, without it every help is "keyword~ text~" and a
+        # help text (which can not hold a ~) is still open after an odd count
+        return data[start:end].count(b"~") % 2 == 0
+    return True
+
+def holds_header(data, start, end):
+    # a section header line index_sections took for text inside the section
+    for match in section_header.finditer(data, start + 1, end):
+        if match.group(1).decode() in section_names:
+            return True
+    return False
+
+def index_sections(data):
+    """Return the (name, start, end) byte range of every section in an area file."""
+    index           = []
+    for match in section_header.finditer(data):
+        header      = match.group(1).decode()
+        if header != "$" and header not in section_names:
+            continue
+        if index:
+            name, start = index[-1][:2]
+            if not section_closed(name, data, start, match.start()):
+                continue
+            index[-1][2] = match.start()
+        if header == "$":
+            break
+        index.append([section_names[header], match.start(), None])
+    if index and index[-1][2] is None:
+        index[-1][2] = len(data)
+    return [tuple(entry) for entry in index]
+
+def scan_sections(data, sections=None):
+    # only the requested byte ranges are scanned, and only their fields decoded
+    result          = {}
+    try:
+        for name, start, end in index_sections(data):
+            if sections is None or name in sections:
+                result[name] = scan_section(name, data, start, end)
+            elif holds_header(data, start, end):
+                # only a scan to the end of the section confirms the header was
+                # text, a wrong boundary would leave out the requested sections
+                scan_section(name, data, start, end)
+    except ParseException as pe:
+        raise locate_error(pe, data)
+    return result
+
+def scan_section(name, data, start=0, end=None, offsets=None):
+    # with an offsets list, the byte offset of every record (relative to
+    # start) is appended to it, as iter_records reports them
+    sc              = MappedScanner(data, start, end)
+    value           = section_parsers[name](sc)
+    if isinstance(value, types.GeneratorType):
+        records     = []
+        for record in value:
+            records.append(record)
+            if offsets is not None:
+                offsets.append(sc.record_start - start)
+        value       = records
+    elif offsets is not None:
+        offsets.append(0)
+    sc.finish()
+    return value
+
+@contextlib.contextmanager
+def map_area(path):
+    """Map an area file read-only, an empty file (which can not be mapped) gives b""."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+def iter_records(path, sections=None, offsets=False):
+    """
+    Yield (section, record) pairs one record at a time, or (section, record,
+    offset) with the byte offset of the record in the file. The file is memory
+    mapped and no record is kept after it has been yielded. #AREA,
+    #RESETMESSAGE and #FLAG are yielded as a single record.
+    """
+    with map_area(path) as data:
+        try:
+            for name, start, end in index_sections(data):
+                if sections is not None and name not in sections:
+                    if holds_header(data, start, end):
+                        scan_section(name, data, start, end)
+                    continue
+                sc      = MappedScanner(data, start, end)
+                value   = section_parsers[name](sc)
+                if not isinstance(value, types.GeneratorType):
+                    sc.finish()
+                    yield (name, value, start) if offsets else (name, value)
+                    continue
+                for record in value:
+                    yield (name, record, sc.record_start) if offsets else (name, record)
+                sc.finish()
+        except ParseException as pe:
+            raise locate_error(pe, data)
+
+def write_ndjson(records, f):
+    for section, record, *offset in records:
+        line        = {'section': section, 'record': record}
+        if offset:
+            line['offset'] = offset[0]
+        f.write(json.dumps(line, default=typed_json))
+        f.write("\n")
+
+
+########################################################################################
+#  Typed records (--typed)                                                             #
+#                                                                                      #
+#  The same records with the numbers converted to ints, ROM letter flags decoded to    #
+#  bitmasks and dice split into (count, sides, bonus). Field names are the ones of     #
+#  the plain output so consumers only lose the string parsing.                         #
+########################################################################################
+
+Dice                = collections.namedtuple("Dice", "count sides bonus")
+
+dice_pattern        = re.compile(r"(\d+)d(\d+)([+-]\d+)?$")
+value_pattern       = re.compile(r"'[^']*'|\S+")
+
+def flag_value(flags):
+    """Decode a ROM flag: a number or letters, A-Z for bits 0-25 and a-z for 26-51."""
+    value           = 0
+    for part in flags.split("|"):
+        if part.lstrip("-").isdigit():
+            value  |= int(part)
+            continue
+        for c in part:
+            if "A" <= c <= "Z":
+                value |= 1 << (ord(c) - ord("A"))
+            elif "a" <= c <= "z":
+                value |= 1 << (26 + ord(c) - ord("a"))
+    return value
+
+def dice_value(dice):
+    match           = dice_pattern.match(dice)
+    if match is None:
+        raise ValueError("not a dice string: %r" % dice)
+    count, sides, bonus = match.groups()
+    return Dice(int(count), int(sides), int(bonus or 0))
+
+def item_values(values):
+    # "sword 3 4 'acid blast' 0" -> ['sword', 3, 4, 'acid blast', 0]
+    items           = []
+    for value in value_pattern.findall(values):
+        if value.lstrip("-").isdigit():
+            items.append(int(value))
+        else:
+            items.append(value.strip("'"))
+    return items
+
+@dataclasses.dataclass
+class Area(object):
+    __slots__       = ("file", "name", "low_range", "high_range", "writer", "credits", "min_vnum", "max_vnum")
+    file:           str
+    name:           str
+    low_range:      int
+    high_range:     int
+    writer:         str
+    credits:        str
+    min_vnum:       int
+    max_vnum:       int
+
+@dataclasses.dataclass
+class Exit(object):
+    __slots__       = ("exit_door", "exit_description", "exit_keyword", "exit_locks", "exit_key", "exit_u1_vnum")
+    exit_door:          int
+    exit_description:   str
+    exit_keyword:       str
+    exit_locks:         int
+    exit_key:           int
+    exit_u1_vnum:       int
+
+@dataclasses.dataclass
+class Room(object):
+    __slots__       = ("vnum", "name", "description", "flags", "sector", "heal_rate", "mana_rate", "owner",
+                       "exits", "extra_descriptions")
+    vnum:               int
+    name:               str
+    description:        str
+    flags:              int
+    sector:             int
+    heal_rate:          int
+    mana_rate:          int
+    owner:              str
+    exits:              list
+    extra_descriptions: list
+
+@dataclasses.dataclass
+class Object(object):
+    __slots__       = ("vnum", "name", "short_description", "description", "material", "type", "extra_flags",
+                       "wear_flags", "values", "level", "weight", "cost", "condition", "affects_a", "affects_f",
+                       "extra_descriptions")
+    vnum:               int
+    name:               str
+    short_description:  str
+    description:        str
+    material:           str
+    type:               str
+    extra_flags:        int
+    wear_flags:         int
+    values:             list
+    level:              int
+    weight:             int
+    cost:               int
+    condition:          str
+    affects_a:          list
+    affects_f:          list
+    extra_descriptions: list
+
+@dataclasses.dataclass
+class Mobile(object):
+    __slots__       = ("vnum", "name", "short_description", "long_description", "description", "race", "act",
+                       "affected_by", "alignment", "group", "level", "hitroll", "hit_dice", "mana_dice", "dam_dice",
+                       "dam_type", "ac_pierce", "ac_bash", "ac_slash", "ac_exotic", "off_flags", "imm_flags",
+                       "res_flags", "vuln_flags", "start_pos", "default_pos", "sex", "wealth", "form", "parts",
+                       "size", "material", "affects_f")
+    vnum:               int
+    name:               str
+    short_description:  str
+    long_description:   str
+    description:        str
+    race:               str
+    act:                int
+    affected_by:        int
+    alignment:          int
+    group:              int
+    level:              int
+    hitroll:            int
+    hit_dice:           Dice
+    mana_dice:          Dice
+    dam_dice:           Dice
+    dam_type:           str
+    ac_pierce:          int
+    ac_bash:            int
+    ac_slash:           int
+    ac_exotic:          int
+    off_flags:          int
+    imm_flags:          int
+    res_flags:          int
+    vuln_flags:         int
+    start_pos:          str
+    default_pos:        str
+    sex:                str
+    wealth:             int
+    form:               int
+    parts:              int
+    size:               str
+    material:           str
+    affects_f:          list
+
+@dataclasses.dataclass
+class Reset(object):
+    __slots__       = ("command", "arg1", "arg2", "arg3", "arg4")
+    command:        str
+    arg1:           int
+    arg2:           int
+    arg3:           int
+    arg4:           int
+
+def typed_area(area):
+    return Area(area['file'], area['name'], int(area['low_range']), int(area['high_range']),
+                area['writer'], area['credits'], int(area['min_vnum']), int(area['max_vnum']))
+
+def typed_room(room):
+    exits           = [Exit(int(e['exit_door'][1:]), e['exit_description'], e['exit_keyword'],
+                            int(e['exit_locks']), int(e['exit_key']), int(e['exit_u1_vnum']))
+                       for e in room.get('exits', [])]
+    return Room(int(room['vnum']), room['name'], room['description'], flag_value(room['flags']),
+                int(room['sector']), int(room['heal_rate'][0]) if 'heal_rate' in room else 100,
+                int(room['mana_rate'][0]) if 'mana_rate' in room else 100,
+                room['owner'][0] if 'owner' in room else "", exits, room.get('extra_descriptions', []))
+
+def typed_object(obj):
+    affects_a       = [{'location': int(a['location']), 'modifier': int(a['modifier'])}
+                       for a in obj.get('affects_a', [])]
+    affects_f       = [{'where': a['where'], 'location': int(a['location']), 'modifier': int(a['modifier']),
+                        'bitvector': flag_value(a['bitvector'])}
+                       for a in obj.get('affects_f', [])]
+    return Object(int(obj['vnum']), obj['name'], obj['short_description'], obj['description'],
+                  obj['material'], obj['type'], flag_value(obj['extra_flags']), flag_value(obj['wear_flags']),
+                  item_values(obj['values']), int(obj['level']), int(obj['weight']), int(obj['cost']),
+                  obj['condition'], affects_a, affects_f, obj.get('extra_descriptions', []))
+
+def typed_mobile(mob):
+    affects_f       = [{'word': a['word'], 'flag': flag_value(a['flag'])} for a in mob.get('affects_f', [])]
+    return Mobile(int(mob['vnum']), mob['name'], mob['short_description'], mob['long_description'],
+                  mob['description'], mob['race'], flag_value(mob['act']), flag_value(mob['affected_by']),
+                  int(mob['alignment']), int(mob['group']), int(mob['level']), int(mob['hitroll']),
+                  dice_value(mob['hit_dice']), dice_value(mob['mana_dice']), dice_value(mob['dam_dice']),
+                  mob['dam_type'], int(mob['ac_pierce']), int(mob['ac_bash']), int(mob['ac_slash']),
+                  int(mob['ac_exotic']), flag_value(mob['off_flags']), flag_value(mob['imm_flags']),
+                  flag_value(mob['res_flags']), flag_value(mob['vuln_flags']), mob['start_pos'],
+                  mob['default_pos'], mob['sex'], int(mob['wealth']), flag_value(mob['form']),
+                  flag_value(mob['parts']), mob['size'], mob['material'], affects_f)
+
+def typed_reset(reset):
+    return Reset(reset['command'], int(reset['arg1']), int(reset['arg2']),
+                 int(reset.get('arg3', 0)), int(reset.get('arg4', 0)))
+
+typed_records       = {
+    "area":         typed_area,
+    "rooms":        typed_room,
+    "objects":      typed_object,
+    "mobiles":      typed_mobile,
+    "resets":       typed_reset
+}
 
-    content         = ZeroOrMore(pattern)
+def typed_record(section, record):
+    """Convert one record of section, records of other sections are returned as they are."""
+    convert         = typed_records.get(section)
+    return convert(record) if convert else record
 
-    area_parser     = content + Suppress("#$")
+def to_typed(area):
+    """Convert a parsed area (as returned by parse_file) to typed records."""
+    typed           = {}
+    for section, value in area.items():
+        if isinstance(value, list):
+            typed[section] = [typed_record(section, record) for record in value]
+        else:
+            typed[section] = typed_record(section, value)
+    return typed
 
+def typed_json(value):
+    # json.dump default= hook for the record classes
+    if dataclasses.is_dataclass(value):
+        return dict((name, getattr(value, name)) for name in value.__slots__)
+    raise TypeError("%r is not JSON serializable" % (value,))
+
+
+########################################################################################
+#  World index (--validate)                                                            #
+#                                                                                      #
+#  Hash maps from vnum to room, object and mobile over every loaded area, used to      #
+#  resolve the vnums areas use to point at each other. Everything is a dict lookup,    #
+#  so checking a whole world is linear in the number of records.                       #
+########################################################################################
+
+# reset command -> (argument, section the vnum points into)
+reset_references    = {
+    "M":            (("arg1", "mobiles"), ("arg3", "rooms")),
+    "O":            (("arg1", "objects"), ("arg3", "rooms")),
+    "P":            (("arg1", "objects"), ("arg3", "objects")),
+    "G":            (("arg1", "objects"),),
+    "E":            (("arg1", "objects"),),
+    "D":            (("arg1", "rooms"),),
+    "R":            (("arg1", "rooms"),)
+}
+
+class WorldIndex(object):
+    """
+    Vnum index over many parsed areas (the dicts returned by parse_file).
+    rooms, objects and mobiles map an int vnum to (area name, record).
+    """
+
+    def __init__(self):
+        self.areas          = collections.OrderedDict()
+        self.rooms          = {}
+        self.objects        = {}
+        self.mobiles        = {}
+        self.duplicates     = []
+        self.ranges         = []
+        self.reach          = None
+
+    def add(self, name, area):
+        self.areas[name]    = area
+        for section, table in (("rooms", self.rooms), ("objects", self.objects), ("old_objects", self.objects),
+                               ("mobiles", self.mobiles), ("old_mobiles", self.mobiles)):
+            for record in area.get(section, []):
+                vnum        = int(record['vnum'])
+                if vnum in table:
+                    self.duplicates.append((section.replace("old_", ""), vnum, table[vnum][0], name))
+                table[vnum] = (name, record)
+        if 'area' in area:
+            self.ranges.append((int(area['area']['min_vnum']), int(area['area']['max_vnum']), name))
+            self.reach      = None
+
+    def sort_ranges(self):
+        # ranges sorted by their start, reach[i] is the highest vnum covered by ranges[:i+1]
+        if self.reach is None:
+            self.ranges.sort()
+            self.reach      = []
+            for low, high, name in self.ranges:
+                self.reach.append(max(high, self.reach[-1]) if self.reach else high)
+
+    def area_of(self, vnum):
+        """Return the name of the area whose vnum range holds vnum, or None."""
+        self.sort_ranges()
+        i                   = bisect.bisect_right(self.ranges, (vnum, float("inf"), "")) - 1
+        while i >= 0 and self.reach[i] >= vnum:
+            low, high, name = self.ranges[i]
+            if high >= vnum:
+                return name
+            i              -= 1
+        return None
+
+    def overlaps(self):
+        """Return (area, area) pairs whose vnum ranges overlap."""
+        self.sort_ranges()
+        pairs               = []
+        open_ranges         = []
+        for low, high, name in self.ranges:
+            open_ranges     = [(h, n) for h, n in open_ranges if h >= low]
+            pairs.extend((n, name) for h, n in open_ranges)
+            open_ranges.append((high, name))
+        return pairs
+
+    def references(self):
+        """Yield (area, section, record, field, target section, target vnum) for every vnum reference."""
+        for name, area in self.areas.items():
+            for room in area.get('rooms', []):
+                for door in room.get('exits', []):
+                    if int(door['exit_u1_vnum']) > 0:
+                        yield name, 'rooms', room['vnum'], 'exit_u1_vnum', 'rooms', int(door['exit_u1_vnum'])
+                    if int(door['exit_key']) > 0:
+                        yield name, 'rooms', room['vnum'], 'exit_key', 'objects', int(door['exit_key'])
+            for reset in area.get('resets', []):
+                for field, target in reset_references.get(reset['command'], ()):
+                    yield name, 'resets', reset['command'] + " " + reset['arg1'], field, target, int(reset[field])
+            for shop in area.get('shops', []):
+                yield name, 'shops', shop['keeper'], 'keeper', 'mobiles', int(shop['keeper'])
+            for section in ('specials', 'practicers'):
+                for record in area.get(section, []):
+                    yield name, section, record['vnum'], 'vnum', 'mobiles', int(record['vnum'])
+            for olimit in area.get('olimits', []):
+                yield name, 'olimits', olimit['vnum'], 'vnum', 'objects', int(olimit['vnum'])
+            for omprog in area.get('omprogs', []):
+                target      = 'mobiles' if omprog['command'] == "M" else 'objects'
+                yield name, 'omprogs', omprog['vnum'], 'vnum', target, int(omprog['vnum'])
+
+    def resolve(self, section, vnum):
+        """Return (area name, record) for vnum in section, or None."""
+        return getattr(self, section).get(vnum)
+
+    def dangling(self):
+        """Return the references whose target vnum does not exist in the world."""
+        return [ref for ref in self.references() if self.resolve(ref[4], ref[5]) is None]
+
+def validate_world(index):
+    """Return printable problems of a world: overlapping ranges, duplicate and dangling vnums."""
+    problems            = []
+    for first, second in index.overlaps():
+        problems.append("%s: vnum range overlaps %s" % (second, first))
+    for section, vnum, first, second in index.duplicates:
+        problems.append("%s: %s vnum %d already defined in %s" % (second, section, vnum, first))
+    for name, section, record, field, target, target_vnum in index.dangling():
+        owner           = index.area_of(target_vnum)
+        problems.append("%s: %s %s %s points to missing %s vnum %d%s" % (name, section, record, field, target, target_vnum,
+                        " (in the range of %s)" % owner if owner else ""))
+    return problems
+
+
+########################################################################################
+#  Symbols (--symbols)                                                                 #
+#                                                                                      #
+#  Flags, races, materials, positions and keywords repeat thousands of times over a    #
+#  world. The scanner interns them while parsing, intern_symbols() does the same for   #
+#  areas from pyparsing or the cache, and encode_symbols() writes every repeated       #
+#  string once in a table and refers to it by index.                                   #
+########################################################################################
+
+# free text, unlikely to repeat, never interned
+text_fields         = frozenset(("file", "name", "short_description", "long_description", "description",
+                                 "exit_description", "credits", "text", "area_reset_message"))
+
+def intern_symbols(value, field=None):
+    """Intern every string of a parsed area except free text, in place."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            value[key] = intern_symbols(item, key)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            value[i] = intern_symbols(item, field)
+    elif isinstance(value, str) and field not in text_fields:
+        return sys.intern(value)
+    return value
+
+def map_strings(value, convert):
+    if isinstance(value, dict):
+        return dict((key, map_strings(item, convert)) for key, item in value.items())
+    if isinstance(value, list):
+        return [map_strings(item, convert) for item in value]
+    return convert(value)
+
+def iter_strings(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from iter_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_strings(item)
+    else:
+        yield value
+
+def encode_symbols(area):
+    """
+    Dictionary-encode a parsed area: every string that occurs more than once is
+    stored in symbols, most frequent first, and replaced by its index. All values
+    of the plain output are strings, so any number in the result is an index.
+    """
+    counts          = collections.Counter(iter_strings(area))
+    symbols         = [value for value, count in counts.most_common() if count > 1]
+    ids             = dict((value, i) for i, value in enumerate(symbols))
+    return {
+        'symbols':      symbols,
+        'area':         map_strings(area, lambda value: ids.get(value, value))
+    }
+
+def decode_symbols(encoded):
+    """Turn the output of encode_symbols back into the parsed area."""
+    symbols         = [sys.intern(value) for value in encoded['symbols']]
+    return map_strings(encoded['area'], lambda value: symbols[value] if isinstance(value, int) else value)
+
+
+# every section grammar by the name its result is stored under
+section_grammars    = {
+    "area":                 area_grammar,
+    "rooms":                room_grammar,
+    "objects":              object_grammar,
+    "old_objects":          old_object_grammar,
+    "mobiles":              mobile_grammar,
+    "old_mobiles":          old_mobile_grammar,
+    "resets":               reset_grammar,
+    "shops":                shop_grammar,
+    "olimits":              olimit_grammar,
+    "practicers":           practicer_grammar,
+    "specials":             special_grammar,
+    "omprogs":              omprog_grammar,
+    "helps":                help_grammar,
+    "area_reset_message":   resetmessage_grammar,
+    "area_flag":            areaflag_grammar
+}
+
+# built once at import, the #SECTION header picks the grammar to run
+pattern             = Keyed(dict((header, Group(section_grammars[name]).setResultsName(name))
+                                 for header, name, read in section_readers), key="#[A-Z]+")
+
+area_parser         = ZeroOrMore(pattern) + Suppress("#$")
+area_parser.streamline()
+
+def pyparsing_parse(filemem):
+    result          = area_parser.parse_string(filemem, parseAll=False)
+    return result.asDict()
+
+def scan_text(filemem):
+    # the byte scanner the CLI uses (scan_mapped) for callers that hold a str
+    return scan_mapped(filemem.encode(locale.getpreferredencoding(False)))
+
+engines             = {
+    "fast":         scan_text,
+    "pyparsing":    pyparsing_parse
+}
+
+def parse_file(filemem, engine="pyparsing"):
+    try:
+        return engines[engine](filemem)
+    except ParseException as pe:
+       print(pe.markInputline())
+       print(pe)
+    return
+
+def parse_sections(path, sections=None):
     try:
-        result      = area_parser.parse_string(filemem, parseAll=False)
-        rr          = result.asDict()
-        return rr
+        with map_area(path) as data:
+            return scan_sections(data, sections)
     except ParseException as pe:
        print(pe.markInputline())
        print(pe)
     return
 
+def section_list(value):
+    sections        = value.split(",")
+    for name in sections:
+        if name not in section_parsers:
+            raise argparse.ArgumentTypeError("unknown section: %s (choose from %s)" % (name, ", ".join(section_parsers)))
+    return sections
+
+def area_files(area):
+    """Expand a directory, a glob pattern or an area.lst file into a list of area files."""
+    if os.path.isdir(area):
+        return sorted(glob.glob(os.path.join(area, "*.are")))
+    if area.endswith(".lst"):
+        folder      = os.path.dirname(area)
+        files       = []
+        with open(area, "r") as f:
+            for line in f:
+                name = line.strip()
+                if name == "$":
+                    break
+                if name:
+                    files.append(os.path.join(folder, name))
+        return files
+    if any(c in area for c in "*?["):
+        return sorted(glob.glob(area))
+    return None
+
+class AreaCache(object):
+    """
+    On-disk cache of converted areas. Entries are keyed on the bytes of the .are
+    file, the options and a fingerprint of this script and pyparsing, so editing
+    a grammar invalidates every entry. The least recently used entries are
+    removed once the cache grows past max_bytes. The cache is best-effort: the
+    first error reading or writing it is printed and the cache is switched off.
+    """
+
+    def __init__(self, folder, max_bytes=256*1024*1024):
+        self.folder     = folder
+        self.max_bytes  = max_bytes
+        self.disabled   = False
+        with open(os.path.abspath(__file__), "rb") as f:
+            self.version = hashlib.sha256(f.read() + pyparsing.__version__.encode()).hexdigest()
+
+    def key(self, data, engine, sections=None):
+        h               = hashlib.sha256(self.version.encode())
+        h.update(("%s %s\n" % (engine, ",".join(sections or []))).encode())
+        h.update(data)
+        return h.hexdigest()
+
+    def disable(self, error):
+        if not self.disabled:
+            print("warning: cache disabled: %s" % error, file=sys.stderr)
+        self.disabled   = True
+
+    def probe(self):
+        """Switch the cache off now if its folder can not be written."""
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            if not os.access(self.folder, os.W_OK):
+                raise PermissionError("%s is not writable" % self.folder)
+        except OSError as e:
+            self.disable(e)
+        return self
+
+    def get(self, key):
+        if self.disabled:
+            return None
+        path            = os.path.join(self.folder, key+".json")
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            self.disable(e)
+            return None
+        return path
+
+    def load(self, key):
+        """Return the cached value of key, or None."""
+        path            = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.disable(e)
+            return None
+
+    def put(self, key, text):
+        if self.disabled:
+            return
+        path            = os.path.join(self.folder, key+".json")
+        temp            = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(temp, "w") as f:
+                f.write(text)
+            os.replace(temp, path)
+        except OSError as e:
+            self.disable(e)
+            return
+        self.evict()
+
+    def evict(self):
+        entries         = []
+        try:
+            scan        = list(os.scandir(self.folder))
+        except OSError as e:
+            self.disable(e)
+            return
+        for entry in scan:
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total           = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total      -= size
+
+class IncrementalArea(object):
+    """
+    Keeps the last parse of an area file per section, keyed on a hash of the
+    section's bytes. update() only scans the sections whose bytes changed and
+    reuses the others; with a cache, unchanged sections also survive between
+    runs. parsed lists the sections scanned by the last update and offsets the
+    byte offset in the file of each of their records, like iter_records.
+    """
+
+    def __init__(self, path, cache=None):
+        self.path           = path
+        self.cache          = cache
+        self.sections       = {}
+        self.parsed         = []
+        self.offsets        = {}
+        self.mtime          = None
+
+    def section(self, name, data, start, end):
+        # returns the digest of the section's bytes, its value and the offsets
+        # of its records relative to start
+        block               = data[start:end]
+        digest              = hashlib.sha256(block).hexdigest()
+        if digest in self.sections:
+            return (digest,) + self.sections[digest][1:]
+        key                 = self.cache.key(block, "section", [name]) if self.cache else None
+        cached              = self.cache.load(key) if key else None
+        if cached is not None:
+            value, offsets  = cached
+            return digest, intern_symbols(value), offsets
+        offsets             = []
+        value               = scan_section(name, data, start, end, offsets)
+        self.parsed.append(name)
+        if key:
+            self.cache.put(key, json.dumps([value, offsets]))
+        return digest, value, offsets
+
+    def update(self, data, sections=None):
+        area                = {}
+        kept                = {}
+        self.parsed         = []
+        self.offsets        = {}
+        try:
+            for name, start, end in index_sections(data):
+                if sections is None or name in sections:
+                    digest, area[name], offsets = self.section(name, data, start, end)
+                    kept[digest] = (name, area[name], offsets)
+                    self.offsets[name] = [start + offset for offset in offsets]
+                elif holds_header(data, start, end):
+                    scan_section(name, data, start, end)
+        except ParseException as pe:
+            raise locate_error(pe, data)
+        self.sections       = kept
+        return area
+
+    def load(self, sections=None):
+        self.mtime          = os.stat(self.path).st_mtime_ns
+        with map_area(self.path) as data:
+            return self.update(data, sections)
+
+def default_cache_dir():
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "area-to-json")
+
+def decode_area(data):
+    # same text open(path, "r") would give: locale encoding, universal newlines
+    text            = str(data, locale.getpreferredencoding(False))
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+def parse_area(data, engine="pyparsing", sections=None):
+    """Parse the bytes (or mmap) of an area file."""
+    if sections:
+        return scan_sections(data, sections)
+    if engine == "fast":
+        return scan_mapped(data)
+    return intern_symbols(engines[engine](decode_area(data)))
+
+def load_area(path, engine="pyparsing", sections=None, cache=None, incremental=False):
+    """
+    Return the parsed area, from the cache when the file has not changed. With
+    incremental, only the sections changed since they were last cached are
+    scanned (always with the fast scanner). The file is memory mapped, only the
+    pyparsing engine needs it decoded as a whole.
+    """
+    if incremental:
+        engine          = "fast"
+    with map_area(path) as data:
+        key             = cache.key(data, engine, sections) if cache else None
+        if key:
+            cached      = cache.load(key)
+            if cached is not None:
+                return intern_symbols(cached)
+        if incremental:
+            area        = IncrementalArea(path, cache).update(data, sections)
+        else:
+            area        = parse_area(data, engine, sections)
+    if key:
+        cache.put(key, json.dumps(area, indent=4))
+    return area
+
+def json_path(path):
+    return os.path.splitext(path)[0]+".json"
+
+def binary_path(path):
+    return os.path.splitext(path)[0]+".arb"
+
+def write_output(output, mode, write):
+    # written to a temporary file renamed over the output, so a failed write
+    # leaves the previous output (or none) instead of a partial one
+    temp            = "%s.%d.tmp" % (output, os.getpid())
+    try:
+        with open(temp, mode) as f:
+            write(f)
+        os.replace(temp, output)
+    except OSError:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+def convert_cached(path, engine="pyparsing", sections=None, cache=None):
+    """Copy the cached JSON of an unchanged area to its output, return True on a hit."""
+    if cache is None:
+        return False
+    try:
+        with map_area(path) as data:
+            cached  = cache.get(cache.key(data, engine, sections))
+        if cached:
+            shutil.copyfile(cached, json_path(path))
+            return True
+    except OSError:
+        pass
+    return False
+
+def convert_area(path, engine="pyparsing", sections=None, cache=None, output_format="json", typed=False, incremental=False, symbols=False):
+    """Convert one area file to <name>.json (or .ndjson, .arb), return the error message on failure."""
+    if output_format == "ndjson":
+        return convert_ndjson(path, sections, typed)
+    if output_format == "json" and not typed and not symbols and convert_cached(path, engine, sections, cache):
+        return None
+    try:
+        data = load_area(path, engine, sections, cache, incremental)
+        if typed:
+            data = to_typed(data)
+        elif symbols:
+            data = encode_symbols(data)
+    except ParseException as pe:
+        return pe.markInputline() + "\n" + str(pe)
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        return str(e)
+
+    try:
+        if output_format == "binary":
+            write_output(binary_path(path), "wb", lambda f: write_binary(data, f, typed_json))
+        else:
+            # the symbol table is there to save space, so it is written without indent
+            write_output(json_path(path), "w", lambda f: json.dump(data, f, indent=None if symbols else 4, default=typed_json))
+    except OSError as e:
+        return str(e)
+    return None
+
+def convert_ndjson(path, sections=None, typed=False):
+    """Stream one area file to <name>.ndjson, one record per line."""
+    output          = os.path.splitext(path)[0]+".ndjson"
+    records         = iter_records(path, sections, offsets=True)
+    if typed:
+        records     = ((section, typed_record(section, record), offset) for section, record, offset in records)
+    try:
+        with open(output, "w") as f:
+            write_ndjson(records, f)
+    except (ParseException, OSError, UnicodeDecodeError, ValueError) as e:
+        if os.path.exists(output):
+            os.remove(output)
+        if isinstance(e, ParseException):
+            return e.markInputline() + "\n" + str(e)
+        return str(e)
+    return None
+
+def convert_batch(files, engine="pyparsing", sections=None, jobs=None, cache=None, output_format="json", typed=False, incremental=False, symbols=False):
+    """Convert files across a process pool, yield (path, error) in the order of files."""
+    # unchanged areas are served from the cache without starting any worker,
+    # the cache holds plain JSON so only that output can be copied from it
+    copy_from       = cache if output_format == "json" and not typed and not symbols else None
+    done            = set(path for path in files if convert_cached(path, engine, sections, copy_from))
+    pending         = [path for path in files if path not in done]
+    if jobs == 1 or not pending:
+        for path in files:
+            yield path, None if path in done else convert_area(path, engine, sections, cache, output_format, typed, incremental, symbols)
+        return
+
+    # the biggest files are started first so one large area does not finish last
+    order           = sorted(pending, key=lambda path: -os.path.getsize(path) if os.path.exists(path) else 0)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures     = dict((path, executor.submit(convert_area, path, engine, sections, cache, output_format, typed, incremental, symbols)) for path in order)
+        for path in files:
+            yield path, None if path in done else futures[path].result()
+
+def watch_areas(area, sections=None, cache=None, output_format="json", typed=False, interval=1.0, symbols=False):
+    """Poll the mtime of the area files and rewrite the output of every file that changed."""
+    watched         = {}
+    while True:
+        for path in area_files(area) or [area+".are"]:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if path in watched and watched[path].mtime == mtime:
+                continue
+            incremental = watched.setdefault(path, IncrementalArea(path, cache))
+            start   = time.time()
+            try:
+                data = incremental.load(sections)
+                if typed:
+                    data = to_typed(data)
+                elif symbols:
+                    data = encode_symbols(data)
+                if output_format == "ndjson":
+                    with open(os.path.splitext(path)[0]+".ndjson", "w") as f:
+                        write_ndjson(((section, record, offset) for section, value in data.items()
+                                      for record, offset in zip(value if isinstance(value, list) else [value],
+                                                                incremental.offsets[section])), f)
+                elif output_format == "binary":
+                    write_output(binary_path(path), "wb", lambda f: write_binary(data, f, typed_json))
+                else:
+                    write_output(json_path(path), "w", lambda f: json.dump(data, f, indent=None if symbols else 4, default=typed_json))
+            except ParseException as pe:
+                print(path + ": failed")
+                print(pe.markInputline() + "\n" + str(pe))
+                continue
+            except (OSError, UnicodeDecodeError, ValueError) as e:
+                print(path + ": failed")
+                print(str(e))
+                continue
+            print("%s: updated in %d ms (parsed: %s)" % (path, (time.time() - start) * 1000, ", ".join(incremental.parsed) or "none"))
+            sys.stdout.flush()
+        time.sleep(interval)
+
+########################################################################################
+#  Benchmark (--bench)                                                                 #
+#                                                                                      #
+#  Times an engine on an area file and on copies of it scaled 10x and 100x, and       #
+#  breaks the time down by section grammar. Results are JSON so runs can be diffed.    #
+########################################################################################
+
+# sections reported on their own, everything else is summed up as "rest"
+bench_grammars      = {
+    "rooms":        "room_grammar",
+    "objects":      "object_grammar",
+    "mobiles":      "mobile_grammar",
+    "resets":       "reset_grammar"
+}
+
+def scale_area(data, scale):
+    # the sections of the file repeated scale times before the closing #$
+    body            = data[:data.rindex(b"#$")]
+    return body * scale + b"#$\n"
+
+def count_records(area):
+    return sum(len(value) if isinstance(value, list) else 1 for value in area.values())
+
+def time_sections(data, engine):
+    """Seconds spent parsing each section on its own, by grammar."""
+    times           = dict((name, 0.0) for name in bench_grammars.values())
+    times["rest"]   = 0.0
+    for name, start, end in index_sections(data):
+        start_time  = time.perf_counter()
+        if engine == "pyparsing":
+            section_grammars[name].parse_string(decode_area(data[start:end]))
+        else:
+            scan_section(name, data[start:end])
+        times[bench_grammars.get(name, "rest")] += time.perf_counter() - start_time
+    return times
+
+def max_rss_kb():
+    if resource is None:
+        return None
+    rss             = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+def run_bench(path, engine="pyparsing", scales=(1, 10, 100), profile=None):
+    """
+    Benchmark engine on path at every scale, return the results as a dict. The
+    timings are of parse_area, the path the CLI takes from the bytes of a file
+    (decoding included for pyparsing, the byte scanner for fast).
+    """
+    with open(path, "rb") as f:
+        data        = f.read()
+    records         = count_records(parse_area(data, engine))
+
+    runs            = []
+    for scale in scales:
+        scaled      = scale_area(data, scale)
+
+        start_time  = time.perf_counter()
+        parse_area(scaled, engine)
+        seconds     = time.perf_counter() - start_time
+
+        tracemalloc.start()
+        parse_area(scaled, engine)
+        peak        = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        runs.append({
+            'scale':                scale,
+            'bytes':                len(scaled),
+            'records':              records * scale,
+            'seconds':              seconds,
+            'records_per_second':   records * scale / seconds,
+            'mb_per_second':        len(scaled) / seconds / 1024 / 1024,
+            'peak_traced_bytes':    peak,
+            'max_rss_kb':           max_rss_kb(),
+            'grammars':             time_sections(scaled, engine)
+        })
+
+    if profile:
+        profiler    = cProfile.Profile()
+        profiler.runcall(parse_area, data, engine)
+        profiler.dump_stats(profile)
+
+    return {
+        'file':         path,
+        'engine':       engine,
+        'python':       platform.python_version(),
+        'pyparsing':    pyparsing.__version__,
+        'runs':         runs
+    }
+
+def scale_list(value):
+    try:
+        return [int(scale) for scale in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected comma separated integers: %s" % value)
+
+########################################################################################
+#  Conversion server (--serve)                                                         #
+#                                                                                      #
+#  A long running HTTP server for editors: POST the text of an area file to /convert   #
+#  and get its JSON back. The grammars are built once per worker process, so a         #
+#  request only pays for the parse. Requests beyond the workers and --queue are        #
+#  refused with 503 instead of piling up, and each one is bounded by --timeout.        #
+#                                                                                      #
+#  POST /convert?engine=fast&sections=rooms,mobiles&typed=1                            #
+########################################################################################
+
+max_request_bytes   = 64*1024*1024
+
+def warm_worker():
+    # build and exercise the grammars before the first request reaches the worker
+    parse_area(b"#AREA\nwarm.are~\nWarm~\n{1 2} Writer Warm~\n1 2\n#$\n")
+
+def convert_request(data, engine="pyparsing", sections=None, typed=False):
+    """Parse the bytes of an area file, return (status, JSON bytes). Runs in a worker."""
+    try:
+        area        = parse_area(data, engine, sections)
+        if typed:
+            area    = to_typed(area)
+    except ParseException as pe:
+        return 422, json.dumps({'error': pe.markInputline() + "\n" + str(pe)}).encode()
+    except (UnicodeDecodeError, ValueError) as e:
+        return 422, json.dumps({'error': str(e)}).encode()
+    return 200, json.dumps(area, default=typed_json).encode("utf-8")
+
+def http_response(status, body, headers=()):
+    head            = ["HTTP/1.1 %d %s" % (status, http.HTTPStatus(status).phrase),
+                       "Content-Type: application/json",
+                       "Content-Length: %d" % len(body),
+                       "Connection: close"]
+    head.extend("%s: %s" % header for header in headers)
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+def http_error(status, message, headers=()):
+    return http_response(status, json.dumps({'error': message}).encode(), headers)
+
+class ConversionServer(object):
+    """
+    asyncio HTTP front end over a process pool of warm parsers. pending counts
+    the requests handed to the pool, including ones that timed out but are
+    still running, so a slow area can not make the pool queue grow without
+    bound.
+    """
+
+    def __init__(self, workers=None, queue=16, timeout=30.0):
+        self.workers        = workers or os.cpu_count() or 1
+        self.queue          = queue
+        self.timeout        = timeout
+        self.pending        = 0
+        self.executor       = None
+        self.loop           = None
+
+    def start(self, wait=True):
+        self.executor       = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=warm_worker)
+        # start every worker now rather than on the first requests
+        futures             = [self.executor.submit(len, "") for i in range(self.workers)]
+        if wait:
+            for future in futures:
+                future.result()
+
+    def restart(self, executor):
+        # a worker died (killed, out of memory...) and took the pool with it.
+        # Only the first request to notice replaces it, the futures of the old
+        # pool have all failed and released their pending count.
+        if executor is self.executor:
+            print("worker pool broken, restarting it")
+            sys.stdout.flush()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.start(wait=False)
+
+    def submit(self, *args):
+        executor            = self.executor
+        try:
+            return executor.submit(convert_request, *args)
+        except concurrent.futures.BrokenExecutor:
+            self.restart(executor)
+            return self.executor.submit(convert_request, *args)
+
+    def release(self, future):
+        self.loop.call_soon_threadsafe(self.done)
+
+    def done(self):
+        self.pending       -= 1
+
+    async def convert(self, data, engine, sections, typed):
+        if self.pending >= self.workers + self.queue:
+            return http_error(503, "busy, %d conversions pending" % self.pending, [("Retry-After", "1")])
+        executor            = self.executor
+        try:
+            future          = self.submit(data, engine, sections, typed)
+        except concurrent.futures.BrokenExecutor:
+            return http_error(503, "no worker available", [("Retry-After", "1")])
+        self.pending       += 1
+        future.add_done_callback(self.release)
+        try:
+            status, body    = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            return http_error(504, "conversion took longer than %g seconds" % self.timeout)
+        except concurrent.futures.BrokenExecutor:
+            self.restart(executor)
+            return http_error(500, "the worker converting this area died, the pool was restarted")
+        return http_response(status, body)
+
+    async def read_request(self, reader):
+        # returns the body only when it was sent with a Content-Length that
+        # fits max_request_bytes, respond() answers every other case
+        method, target, version = (await reader.readline()).decode("latin-1").split()
+        headers             = {}
+        while True:
+            line            = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, colon, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "transfer-encoding" in headers or "content-length" not in headers:
+            return method, target, headers, None
+        length              = int(headers["content-length"])
+        if length > max_request_bytes:
+            return method, target, headers, None
+        return method, target, headers, await reader.readexactly(length)
+
+    async def respond(self, reader):
+        try:
+            method, target, headers, data = await asyncio.wait_for(self.read_request(reader), self.timeout)
+        except asyncio.TimeoutError:
+            return http_error(408, "request not received within %g seconds" % self.timeout)
+        except (ValueError, asyncio.IncompleteReadError):
+            return http_error(400, "malformed request")
+        url                 = urllib.parse.urlsplit(target)
+        if url.path != "/convert":
+            return http_error(404, "POST area text to /convert")
+        if method != "POST":
+            return http_error(405, "POST area text to /convert", [("Allow", "POST")])
+        if "transfer-encoding" in headers:
+            return http_error(501, "Transfer-Encoding %s is not supported, send a Content-Length" % headers["transfer-encoding"])
+        if "content-length" not in headers:
+            return http_error(411, "Content-Length required")
+        if data is None:
+            return http_error(413, "area larger than %d bytes" % max_request_bytes)
+        query               = urllib.parse.parse_qs(url.query)
+        engine              = query.get("engine", ["pyparsing"])[0]
+        if engine not in engines:
+            return http_error(400, "unknown engine: %s (choose from %s)" % (engine, ", ".join(sorted(engines))))
+        try:
+            sections        = section_list(query["sections"][0]) if "sections" in query else None
+        except argparse.ArgumentTypeError as e:
+            return http_error(400, str(e))
+        typed               = query.get("typed", ["0"])[0].lower() in ("1", "true", "yes")
+        return await self.convert(data, engine, sections, typed)
+
+    async def handle(self, reader, writer):
+        try:
+            writer.write(await self.respond(reader))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, address):
+        self.loop           = asyncio.get_running_loop()
+        if "/" in address:
+            server          = await asyncio.start_unix_server(self.handle, address)
+        else:
+            host, colon, port = address.rpartition(":")
+            server          = await asyncio.start_server(self.handle, host or "127.0.0.1", int(port))
+        print("serving on %s with %d workers" % (address, self.workers))
+        sys.stdout.flush()
+        async with server:
+            await server.serve_forever()
+
+def serve(address, workers=None, queue=16, timeout=30.0):
+    """Run a ConversionServer on host:port (or a unix socket path) until interrupted."""
+    server          = ConversionServer(workers, queue, timeout)
+    server.start()
+    try:
+        asyncio.run(server.serve(address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(cancel_futures=True)
+        if "/" in address and os.path.exists(address):
+            os.remove(address)
+
 def main():
     parser          = argparse.ArgumentParser(description='process anatolia 3.0 area file')
-    parser.add_argument('area', help="Area file or list of areas", type=str)
+    parser.add_argument('area', help="Area file or list of areas: an area name without extension, a directory, a glob pattern or an area.lst file", type=str, nargs="?")
+    parser.add_argument('--engine', help="parser engine (default: pyparsing)", choices=sorted(engines), default="pyparsing")
+    parser.add_argument('--sections', help="comma separated sections to convert, e.g. rooms,resets (uses the fast scanner)", type=section_list)
+    parser.add_argument('--format', help="json writes one document, ndjson streams one record per line to <area>.ndjson (uses the fast scanner), binary writes an indexed <area>.arb", choices=["json", "ndjson", "binary"], default="json")
+    parser.add_argument('--typed', help="write numbers as ints, letter flags as bitmasks and dice as [count, sides, bonus]", action="store_true")
+    parser.add_argument('--symbols', help="write each repeated string once in a symbol table and refer to it by index (json only)", action="store_true")
+    parser.add_argument('--incremental', help="only parse the sections changed since the last run (uses the fast scanner and the cache)", action="store_true")
+    parser.add_argument('--watch', help="keep running and reconvert areas as they are saved, only parsing the changed sections", action="store_true")
+    parser.add_argument('--interval', help="seconds between checks for --watch (default: 1)", type=float, default=1.0)
+    parser.add_argument('--bench', help="do not convert, time the engine on the area and on copies of it scaled by --bench-scales", action="store_true")
+    parser.add_argument('--bench-scales', help="comma separated scales for --bench (default: 1,10,100)", type=scale_list, default=[1, 10, 100])
+    parser.add_argument('--bench-output', help="write the --bench results to this file instead of printing them")
+    parser.add_argument('--profile', help="with --bench, dump a cProfile of parsing the area to this file")
+    parser.add_argument('--validate', help="do not convert, check vnum references across all given areas", action="store_true")
+    parser.add_argument('--jobs', help="number of worker processes in batch mode and for --serve (default: number of cpus)", type=int)
+    parser.add_argument('--serve', help="do not convert, serve POST /convert over HTTP on host:port, or on a unix socket when given a path", metavar="ADDRESS")
+    parser.add_argument('--queue', help="with --serve, conversions allowed to wait for a worker before answering 503 (default: 16)", type=int, default=16)
+    parser.add_argument('--timeout', help="with --serve, seconds allowed per request (default: 30)", type=float, default=30.0)
+    parser.add_argument('--cache-dir', help="cache of converted areas (default: %s)" % default_cache_dir(), default=default_cache_dir())
+    parser.add_argument('--cache-size', help="maximum size of the cache in MB (default: 256)", type=int, default=256)
+    parser.add_argument('--no-cache', help="always parse, do not read or write the cache", action="store_true")
     
     args            = parser.parse_args()
+    cache           = None if args.no_cache else AreaCache(args.cache_dir, args.cache_size*1024*1024).probe()
+    if args.symbols and (args.typed or args.format != "json"):
+        parser.error("--symbols only works with the plain json output")
+    if args.serve:
+        serve(args.serve, args.jobs, args.queue, args.timeout)
+        return
+    if args.area is None:
+        parser.error("the area argument is required")
     
-    with open(args.area+".are", "r") as f:
-        data = parse_file(f.read())
-    
-    with open(args.area+".json", "w") as f:
-        json.dump(data, f, indent=4)
+    if args.incremental or args.watch:
+        args.engine = "fast"
+    if args.watch:
+        try:
+            watch_areas(args.area, args.sections, cache, args.format, args.typed, args.interval, args.symbols)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.bench:
+        results     = run_bench(args.area+".are", args.engine, args.bench_scales, args.profile)
+        if args.bench_output:
+            with open(args.bench_output, "w") as f:
+                json.dump(results, f, indent=4)
+        else:
+            print(json.dumps(results, indent=4))
+        return
+
+    files           = area_files(args.area)
+    if args.validate:
+        index       = WorldIndex()
+        failed      = 0
+        for path in files if files is not None else [args.area+".are"]:
+            try:
+                index.add(os.path.basename(path), load_area(path, args.engine, None, cache))
+            except ParseException as pe:
+                failed += 1
+                print(path + ": failed")
+                print(pe.markInputline() + "\n" + str(pe))
+            except (OSError, UnicodeDecodeError, ValueError) as e:
+                failed += 1
+                print(path + ": failed")
+                print(str(e))
+        problems    = validate_world(index)
+        for problem in problems:
+            print(problem)
+        print("%d areas, %d rooms, %d objects, %d mobiles, %d problems" % (len(index.areas), len(index.rooms),
+              len(index.objects), len(index.mobiles), len(problems)))
+        sys.exit(1 if failed or problems else 0)
+
+    if files is not None:
+        failed      = 0
+        for path, error in convert_batch(files, args.engine, args.sections, args.jobs, cache, args.format, args.typed, args.incremental, args.symbols):
+            if error is None:
+                print(path + ": ok")
+            else:
+                failed += 1
+                print(path + ": failed")
+                print(error)
+        print("%d of %d areas converted" % (len(files) - failed, len(files)))
+        sys.exit(1 if failed else 0)
+
+    error           = convert_area(args.area+".are", args.engine, args.sections, cache, args.format, args.typed, args.incremental, args.symbols)
+    if error is not None:
+        print(error)
+        sys.exit(1)
 
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
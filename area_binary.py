@@ -0,0 +1,129 @@
+########################################################################################
+#                                                                                      #
+#  Reader and writer of the binary area format (area-to-json.py --format binary)       #
+#  github.com/ozgyilmaz/Anatolia-MUD-area-to-JSON-converter                            #
+#                                                                                      #
+#  Only needs the standard library, so tools can import it to load rooms, objects and  #
+#  mobiles from .arb files without pyparsing or the grammars of the converter.         #
+#                                                                                      #
+#  Example:                                                                            #
+#  from area_binary import BinaryArea                                                  #
+#  with BinaryArea("under2.arb") as area:                                              #
+#      room = area.get("rooms", 16001)                                                 #
+#                                                                                      #
+#  <area>.arb holds every record as a length-prefixed compact JSON blob, followed by   #
+#  a footer index with the offset of each record and of each vnum, so a reader can     #
+#  map the file and decode only the records it is asked for.                           #
+#                                                                                      #
+#  header   "ARB1"                                                                     #
+#  record   u32 length, utf-8 JSON                                                     #
+#  footer   a record: [[section, is_list, [record offsets], {vnum: record}], ...]      #
+#  trailer  u64 offset of the footer, "ARB1"                                           #
+#                                                                                      #
+########################################################################################
+
+import collections
+import json
+import mmap
+import struct
+
+binary_magic        = b"ARB1"
+binary_length       = struct.Struct("<I")
+binary_trailer      = struct.Struct("<Q4s")
+
+# sections whose vnum identifies the record, the others only point at vnums
+vnum_sections       = ("rooms", "objects", "old_objects", "mobiles", "old_mobiles")
+
+def write_binary_record(value, f, default=None):
+    data            = json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=default).encode("utf-8")
+    f.write(binary_length.pack(len(data)))
+    f.write(data)
+
+def write_binary(area, f, default=None):
+    """
+    Write a parsed area to f in the binary format. default is the json.dumps
+    hook for values JSON can not store, e.g. the typed records of the converter.
+    """
+    f.write(binary_magic)
+    index           = []
+    for section, value in area.items():
+        is_list     = isinstance(value, list)
+        offsets     = []
+        vnums       = {}
+        for record in (value if is_list else [value]):
+            if section in vnum_sections:
+                vnum = record['vnum'] if isinstance(record, dict) else record.vnum
+                vnums.setdefault(str(vnum), len(offsets))
+            offsets.append(f.tell())
+            write_binary_record(record, f, default)
+        index.append([section, is_list, offsets, vnums])
+    footer          = f.tell()
+    write_binary_record(index, f, default)
+    f.write(binary_trailer.pack(footer, binary_magic))
+
+class BinaryArea(object):
+    """
+    Lazy reader of an .arb file. Only the footer index is decoded on open,
+    get() and records() decode one record at a time and load() gives back the
+    same structure as the JSON output.
+    """
+
+    def __init__(self, path):
+        self.path           = path
+        with open(path, "rb") as f:
+            try:
+                self.data   = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("%s: not a binary area file" % path)
+        size                = len(self.data)
+        if size < len(binary_magic) + binary_trailer.size or self.data[:len(binary_magic)] != binary_magic:
+            self.close()
+            raise ValueError("%s: not a binary area file" % path)
+        footer, magic       = binary_trailer.unpack_from(self.data, size - binary_trailer.size)
+        if magic != binary_magic:
+            self.close()
+            raise ValueError("%s: truncated binary area file" % path)
+        self.index          = collections.OrderedDict((section, (is_list, offsets, vnums))
+                                                      for section, is_list, offsets, vnums in self.record(footer))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.data.close()
+
+    def blob(self, offset):
+        length,             = binary_length.unpack_from(self.data, offset)
+        start               = offset + binary_length.size
+        return self.data[start:start+length]
+
+    def record(self, offset):
+        return json.loads(self.blob(offset))
+
+    def sections(self):
+        return list(self.index)
+
+    def get(self, section, vnum):
+        """Return the record of vnum in section (rooms, objects, mobiles...), or None."""
+        if section not in self.index:
+            return None
+        is_list, offsets, vnums = self.index[section]
+        position            = vnums.get(str(vnum))
+        return None if position is None else self.record(offsets[position])
+
+    def records(self, section):
+        """Yield the records of section one at a time."""
+        for offset in self.index[section][1]:
+            yield self.record(offset)
+
+    def section(self, section):
+        # one json.loads over the whole section instead of one per record
+        is_list, offsets, vnums = self.index[section]
+        records             = json.loads(b"[" + b",".join(self.blob(offset) for offset in offsets) + b"]")
+        return records if is_list else records[0]
+
+    def load(self):
+        return dict((section, self.section(section)) for section in self.index)
@@ -0,0 +1,283 @@
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import area_binary
+
+here                = os.path.dirname(os.path.abspath(__file__))
+sample_area         = os.path.join(here, "sample files", "under2.are")
+sample_json         = os.path.join(here, "sample files", "under2.json")
+
+def load_script():
+    # area-to-json.py is a script, not an importable module name
+    spec            = importlib.util.spec_from_file_location("area_to_json", os.path.join(here, "area-to-json.py"))
+    module          = importlib.util.module_from_spec(spec)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        spec.loader.exec_module(module)
+    return module
+
+a2j                 = load_script()
+
+
+class EngineTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(sample_area, "rb") as f:
+            cls.data    = f.read()
+        cls.text        = a2j.decode_area(cls.data)
+        with open(sample_json, "r") as f:
+            cls.expected = json.load(f)
+
+    def test_engines_agree_on_under2(self):
+        pyparsing_result    = a2j.pyparsing_parse(self.text)
+        self.assertEqual(a2j.scan_file(self.text), pyparsing_result)
+        self.assertEqual(a2j.scan_mapped(self.data), pyparsing_result)
+        self.assertEqual(pyparsing_result, self.expected)
+
+    def test_pyparsing_output_unchanged(self):
+        # the converter output, key order and indentation included, must stay
+        # byte for byte the published under2.json
+        with open(sample_json, "r") as f:
+            expected_text   = f.read()
+        self.assertEqual(json.dumps(a2j.parse_file(self.text, "pyparsing"), indent=4), expected_text)
+        self.assertEqual(json.dumps(a2j.parse_area(self.data, "pyparsing"), indent=4), expected_text)
+
+    def test_symbols_round_trip(self):
+        # --symbols output decodes back to the plain output, byte for byte
+        with open(sample_json, "r") as f:
+            expected_text   = f.read()
+        for engine in ("pyparsing", "fast"):
+            encoded         = json.loads(json.dumps(a2j.encode_symbols(a2j.parse_area(self.data, engine))))
+            self.assertEqual(json.dumps(a2j.decode_symbols(encoded), indent=4), expected_text)
+
+
+class BinaryTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        with open(sample_area, "rb") as f:
+            area        = a2j.parse_area(f.read(), "fast")
+        folder          = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path            = os.path.join(folder, "under2.arb")
+        with open(path, "wb") as f:
+            area_binary.write_binary(area, f)
+        with area_binary.BinaryArea(path) as binary:
+            self.assertEqual(binary.load(), area)
+            self.assertEqual(list(binary.load()), list(area))
+            self.assertEqual(binary.get("rooms", area["rooms"][0]["vnum"]), area["rooms"][0])
+            self.assertIsNone(binary.get("rooms", 1))
+
+
+class ConvertTests(unittest.TestCase):
+
+    def test_write_error_is_reported(self):
+        folder          = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path            = os.path.join(folder, "under2.are")
+        shutil.copyfile(sample_area, path)
+        os.mkdir(os.path.join(folder, "under2.json"))
+        self.assertIsNotNone(a2j.convert_area(path, "fast"))
+        self.assertEqual(sorted(os.listdir(folder)), ["under2.are", "under2.json"])
+
+
+class TypedTests(unittest.TestCase):
+
+    def test_flag_value(self):
+        self.assertEqual(a2j.flag_value("CDEF"), 60)
+        self.assertEqual(a2j.flag_value("A|B"), 3)
+        self.assertEqual(a2j.flag_value("8"), 8)
+        self.assertEqual(a2j.flag_value("8|A"), 9)
+        self.assertEqual(a2j.flag_value("0"), 0)
+        self.assertEqual(a2j.flag_value("a"), 1 << 26)
+        self.assertEqual(a2j.flag_value("Zb"), 1 << 25 | 1 << 27)
+
+    def test_dice_value(self):
+        self.assertEqual(a2j.dice_value("10d10+1000"), a2j.Dice(10, 10, 1000))
+        self.assertEqual(a2j.dice_value("2d6-1"), a2j.Dice(2, 6, -1))
+        self.assertEqual(a2j.dice_value("1d4"), a2j.Dice(1, 4, 0))
+        with self.assertRaises(ValueError):
+            a2j.dice_value("d4")
+
+    def test_item_values(self):
+        self.assertEqual(a2j.item_values("sword 3 4 'acid blast' 0"), ["sword", 3, 4, "acid blast", 0])
+        self.assertEqual(a2j.item_values("12 'cure light' 'armor' '' -1"), [12, "cure light", "armor", "", -1])
+
+    def test_typed_room_defaults(self):
+        room            = {"vnum": "100", "name": "Room", "description": "", "flags": "CD", "sector": "1"}
+        typed           = a2j.typed_room(room)
+        self.assertEqual((typed.vnum, typed.flags, typed.heal_rate, typed.mana_rate, typed.owner, typed.exits),
+                         (100, 12, 100, 100, "", []))
+        room.update(heal_rate=["150"], mana_rate=["50"], owner=["Zeus"])
+        typed           = a2j.typed_room(room)
+        self.assertEqual((typed.heal_rate, typed.mana_rate, typed.owner), (150, 50, "Zeus"))
+
+
+class IncrementalTests(unittest.TestCase):
+
+    def test_update_one_room(self):
+        folder          = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path            = os.path.join(folder, "under2.are")
+        shutil.copyfile(sample_area, path)
+        incremental     = a2j.IncrementalArea(path)
+        with open(sample_area, "rb") as f:
+            data        = f.read()
+        self.assertEqual(incremental.load(), a2j.scan_mapped(data))
+        room            = a2j.scan_mapped(data)["rooms"][0]
+        data            = data.replace(room["name"].encode() + b"~", b"Renamed room~", 1)
+        with open(path, "wb") as f:
+            f.write(data)
+        area            = incremental.update(data)
+        self.assertEqual(incremental.parsed, ["rooms"])
+        self.assertEqual(area, a2j.scan_mapped(data))
+        self.assertEqual(area["rooms"][0]["name"], "Renamed room")
+        offsets         = {}
+        for section, record, offset in a2j.iter_records(path, offsets=True):
+            offsets.setdefault(section, []).append(offset)
+        self.assertEqual(incremental.offsets, offsets)
+
+
+def world_area(min_vnum, max_vnum, **sections):
+    area                = {"area": {"min_vnum": str(min_vnum), "max_vnum": str(max_vnum)}}
+    area.update(sections)
+    return area
+
+def world_room(vnum, *exits):
+    return {"vnum": str(vnum), "exits": [{"exit_u1_vnum": str(to), "exit_key": str(key)} for to, key in exits]}
+
+class WorldIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        # inner.are nests in the range of outer.are and redefines its room 100
+        self.index      = a2j.WorldIndex()
+        self.index.add("outer.are", world_area(100, 199,
+            rooms       = [world_room(100, (101, 0), (155, 0)), world_room(101, (100, 120))],
+            objects     = [{"vnum": "120"}],
+            mobiles     = [{"vnum": "100"}],
+            resets      = [{"command": "M", "arg1": "100", "arg2": "1", "arg3": "101", "arg4": "1"},
+                           {"command": "O", "arg1": "999", "arg2": "0", "arg3": "100"}],
+            shops       = [{"keeper": "300"}]))
+        self.index.add("inner.are", world_area(150, 160, rooms=[world_room(100)]))
+
+    def test_area_of(self):
+        self.assertEqual(self.index.area_of(100), "outer.are")
+        self.assertEqual(self.index.area_of(155), "inner.are")
+        self.assertEqual(self.index.area_of(170), "outer.are")
+        self.assertIsNone(self.index.area_of(99))
+        self.assertIsNone(self.index.area_of(300))
+
+    def test_overlaps_and_duplicates(self):
+        self.assertEqual(self.index.overlaps(), [("outer.are", "inner.are")])
+        self.assertEqual(self.index.duplicates, [("rooms", 100, "outer.are", "inner.are")])
+        self.assertEqual(self.index.resolve("rooms", 100)[0], "inner.are")
+
+    def test_dangling(self):
+        self.assertEqual(self.index.dangling(), [
+            ("outer.are", "rooms", "100", "exit_u1_vnum", "rooms", 155),
+            ("outer.are", "resets", "O 999", "arg1", "objects", 999),
+            ("outer.are", "shops", "300", "keeper", "mobiles", 300)
+        ])
+
+    def test_validate_world(self):
+        self.assertEqual(a2j.validate_world(self.index), [
+            "inner.are: vnum range overlaps outer.are",
+            "inner.are: rooms vnum 100 already defined in outer.are",
+            "outer.are: rooms 100 exit_u1_vnum points to missing rooms vnum 155 (in the range of inner.are)",
+            "outer.are: resets O 999 arg1 points to missing objects vnum 999",
+            "outer.are: shops 300 keeper points to missing mobiles vnum 300"
+        ])
+
+
+# section header lines inside ~ strings must not split the section
+header_text_area    = b"""#AREA
+test.are~
+Test~
+{ 1 50} Writer Credits~
+100 199
+
+#HELPS
+0 TEST~
+Some help text.
+#AREA
+#ROOMS
+#$
+more text
+~
+
+0 $~
+
+#ROOMS
+#100
+Room~
+Desc
+#OBJECTS
+~
+0 0 0
+S
+#0
+
+#$
+"""
+
+class SectionIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.expected   = a2j.pyparsing_parse(a2j.decode_area(header_text_area))
+
+    def test_headers_inside_strings(self):
+        self.assertEqual([name for name, start, end in a2j.index_sections(header_text_area)], ["area", "helps", "rooms"])
+        self.assertIn("#ROOMS\n#$\n", self.expected["helps"][0]["text"])
+        self.assertEqual(a2j.scan_sections(header_text_area, ["helps"]), {"helps": self.expected["helps"]})
+        self.assertEqual(a2j.scan_sections(header_text_area), self.expected)
+
+    def test_headers_inside_strings_streamed(self):
+        path            = os.path.join(self.tmp(), "headers.are")
+        with open(path, "wb") as f:
+            f.write(header_text_area)
+        records         = [(section, record) for section, value in self.expected.items()
+                           for record in (value if isinstance(value, list) else [value])]
+        self.assertEqual(list(a2j.iter_records(path)), records)
+
+    def test_text_after_vnum_range(self):
+        # the #AREA grammar ignores the rest of the min/max vnum line
+        with open(sample_area, "rb") as f:
+            data        = f.read().replace(b"16000 16300", b"16000 16300 * vnum range", 1)
+        expected        = a2j.pyparsing_parse(a2j.decode_area(data))
+        self.assertIn("mobiles", [name for name, start, end in a2j.index_sections(data)])
+        self.assertEqual(a2j.scan_sections(data, ["mobiles"]), {"mobiles": expected["mobiles"]})
+        path            = os.path.join(self.tmp(), "under2.are")
+        with open(path, "wb") as f:
+            f.write(data)
+        self.assertEqual([record for section, record in a2j.iter_records(path, ["mobiles"])], expected["mobiles"])
+        self.assertEqual(a2j.IncrementalArea(path).load(), expected)
+
+    def test_helps_without_terminator(self):
+        data            = b"#HELPS\n0 KEY~\ntext\n~\n#$\n"
+        expected        = a2j.pyparsing_parse(a2j.decode_area(data))
+        self.assertEqual(a2j.scan_sections(data), expected)
+        path            = os.path.join(self.tmp(), "helps.are")
+        with open(path, "wb") as f:
+            f.write(data)
+        self.assertEqual([record for section, record in a2j.iter_records(path)], expected["helps"])
+
+    def test_missed_boundary_raises(self):
+        # #AREA swallows #MOBILES, which fails instead of leaving it out
+        with open(sample_area, "rb") as f:
+            data        = f.read().replace(b"16000 16300", b"16000 16300\nvnums", 1)
+        with self.assertRaises(a2j.ParseException):
+            a2j.scan_sections(data, ["mobiles"])
+
+    def tmp(self):
+        folder          = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        return folder
+
+
+if __name__ == "__main__":
+    unittest.main()